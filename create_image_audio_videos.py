@@ -6,7 +6,7 @@ Creates videos by combining images with stitched MP3 audio tracks.
 Each image gets paired with a unique sequence of MP3 files up to the specified time limit.
 
 Usage:
-    python create_image_audio_videos.py <image_folder> <mp3_folder> <time_limit_minutes> [output_folder]
+    python create_image_audio_videos.py <image_folder> <mp3_folder> <time_limit_minutes> [output_folder] [--workers N]
 
 Example:
     python create_image_audio_videos.py ./images ./music 120 ./output
@@ -14,9 +14,14 @@ Example:
 
 import os
 import sys
+import json
 import random
+import shutil
 import argparse
 import tempfile
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 try:
     import ffmpeg
@@ -24,6 +29,18 @@ except ImportError:
     print("Error: ffmpeg-python library not found.")
     print("Please install it with: pip install ffmpeg-python")
     sys.exit(1)
+try:
+    import mutagen
+    import mutagen.flac
+    import mutagen.mp3
+    import mutagen.mp4
+    import mutagen.wave
+except ImportError:
+    mutagen = None  # Fall back to ffprobe for every file
+
+
+# Probed (duration, format) per file, keyed by (path, mtime, size) so edited files are re-probed
+_audio_info_cache = {}
 
 
 def get_supported_files(folder, extensions):
@@ -32,135 +49,269 @@ def get_supported_files(folder, extensions):
     if not folder.exists():
         raise ValueError(f"Folder does not exist: {folder}")
     
-    files = []
-    for ext in extensions:
-        files.extend(folder.glob(f"*.{ext}"))
-        files.extend(folder.glob(f"*.{ext.upper()}"))
-    
-    return sorted(files)
+    # Single directory pass, matching extensions case-insensitively
+    exts = {ext.lower() for ext in extensions}
+    with os.scandir(folder) as entries:
+        return sorted(
+            Path(entry.path) for entry in entries
+            if entry.is_file() and Path(entry.name).suffix[1:].lower() in exts
+        )
 
 
-def get_audio_duration(audio_file):
-    """Get audio duration using ffmpeg-python."""
+def get_mutagen_codec(info):
+    """Map mutagen stream info to the matching ffmpeg codec name, or None if unknown."""
+    if isinstance(info, mutagen.mp3.MPEGInfo):
+        return {1: 'mp1', 2: 'mp2', 3: 'mp3'}.get(info.layer)
+    if isinstance(info, mutagen.flac.StreamInfo):
+        return 'flac'
+    if isinstance(info, mutagen.wave.WaveStreamInfo):
+        audio_format = getattr(info, 'audio_format', None)
+        if audio_format == 1:  # Integer PCM
+            return 'pcm_u8' if info.bits_per_sample == 8 else f"pcm_s{info.bits_per_sample}le"
+        if audio_format == 3:  # IEEE float
+            return f"pcm_f{info.bits_per_sample}le"
+        return None
+    if isinstance(info, mutagen.mp4.MP4Info):
+        if info.codec.startswith('mp4a.40.'):
+            return 'aac'
+        return {'alac': 'alac', 'ac-3': 'ac3', 'ec-3': 'eac3'}.get(info.codec)
+    return None
+
+
+def get_audio_info(audio_file):
+    """Get (duration, format) of an audio file, where format is (codec, sample_rate, channels).
+    
+    Reads the header with mutagen and spawns a single ffprobe only when that fails.
+    format is None when the codec cannot be identified.
+    """
+    if mutagen is not None:
+        try:
+            info = mutagen.File(str(audio_file)).info
+            codec = get_mutagen_codec(info)
+            return info.length, (codec, info.sample_rate, info.channels) if codec else None
+        except Exception:
+            pass  # Unreadable by mutagen, let ffprobe try
+    
+    # One ffprobe call for both the duration and the first audio stream's format
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "a:0",
+        "-show_entries", "format=duration:stream=codec_name,sample_rate,channels",
+        "-of", "json", str(audio_file)
+    ]
+    
     try:
-        probe = ffmpeg.probe(str(audio_file))
-        duration = float(probe['format']['duration'])
-        return duration
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        data = json.loads(result.stdout)
+        duration = float(data['format']['duration'])
     except Exception as e:
         print(f"Warning: Could not get duration for {audio_file}: {e}")
-        return 0
+        return 0, None
+    
+    try:
+        stream = data['streams'][0]
+        return duration, (stream['codec_name'], int(stream['sample_rate']), int(stream['channels']))
+    except (KeyError, IndexError, ValueError):
+        return duration, None
 
 
-def create_audio_sequence(available_files, target_duration_seconds, used_songs, temp_dir):
-    """Create an audio sequence using only unused songs and return temp file path."""
-    # Filter out already used songs
-    unused_files = [f for f in available_files if str(f) not in used_songs]
-    
-    if not unused_files:
-        print("Warning: No unused songs available for this video.")
-        return None
+def get_cached_audio_info(audio_file):
+    """Get (duration, format), probing each file at most once per run."""
+    try:
+        stat = os.stat(audio_file)
+        key = (str(audio_file), stat.st_mtime, stat.st_size)
+    except OSError:
+        return get_audio_info(audio_file)
     
-    audio_segments = []
-    current_duration = 0
-    files_for_this_video = unused_files.copy()
-    songs_used_in_this_video = set()
+    if key not in _audio_info_cache:
+        _audio_info_cache[key] = get_audio_info(audio_file)
+    return _audio_info_cache[key]
+
+
+def get_cached_audio_duration(audio_file):
+    """Get audio duration, probing each file at most once per run."""
+    return get_cached_audio_info(audio_file)[0]
+
+
+def get_cached_audio_format(audio_file):
+    """Get (codec, sample_rate, channels) or None, probing each file at most once per run."""
+    return get_cached_audio_info(audio_file)[1]
+
+
+def precompute_audio_info(audio_files):
+    """Fill the audio info cache for all files up front, probing them in parallel."""
+    # mutagen reads headers in-process; only files it cannot parse spawn ffprobe,
+    # and those subprocesses overlap across the pool
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        return list(executor.map(get_cached_audio_info, audio_files))
+
+
+def audio_parts_share_format(parts):
+    """Check that all parts have the same codec, sample rate and channel count."""
+    # The concat demuxer keeps the decoder opened for the first file, so it can
+    # only join parts that are identical at the stream level
+    formats = {get_cached_audio_format(part) for part in parts}
+    return len(formats) == 1 and None not in formats
+
+
+def partition_audio_segments(audio_files, video_count, target_duration_seconds):
+    """Shuffle the songs once and deal them out so no song is used in two videos."""
+    pool = list(audio_files)
+    random.shuffle(pool)
     
-    while current_duration < target_duration_seconds and files_for_this_video:
-        # Randomly select an MP3 file
-        mp3_file = random.choice(files_for_this_video)
+    partitions = []
+    for _ in range(video_count):
+        audio_segments = []
+        current_duration = 0
         
-        try:
-            audio_duration = get_audio_duration(mp3_file)
+        while current_duration < target_duration_seconds and pool:
+            # Take the next randomly ordered audio file
+            audio_file = pool.pop()
+            audio_duration = get_cached_audio_duration(audio_file)
             if audio_duration <= 0:
-                files_for_this_video.remove(mp3_file)
                 continue
             
             # If adding this clip would exceed target, truncate it
             if current_duration + audio_duration > target_duration_seconds:
-                remaining_time = target_duration_seconds - current_duration
                 audio_segments.append({
-                    'file': str(mp3_file),
+                    'file': str(audio_file),
                     'start': 0,
-                    'duration': remaining_time
+                    'duration': target_duration_seconds - current_duration,
+                    'trim': True
                 })
                 current_duration = target_duration_seconds
-                # Mark this song as used
-                songs_used_in_this_video.add(str(mp3_file))
-                break
             else:
                 audio_segments.append({
-                    'file': str(mp3_file),
+                    'file': str(audio_file),
                     'start': 0,
-                    'duration': audio_duration
+                    'duration': audio_duration,
+                    'trim': False
                 })
                 current_duration += audio_duration
-                # Mark this song as used
-                songs_used_in_this_video.add(str(mp3_file))
-                # Remove the file from available files for this sequence
-                files_for_this_video.remove(mp3_file)
-                
-        except Exception as e:
-            print(f"Warning: Could not process {mp3_file}: {e}")
-            if mp3_file in files_for_this_video:
-                files_for_this_video.remove(mp3_file)
-            continue
+        
+        partitions.append(audio_segments)
+    
+    return partitions
+
+
+def write_concat_list(files, list_path):
+    """Write an ffmpeg concat demuxer list referencing the given files."""
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for file in files:
+            # Quote for the concat demuxer: ' becomes '\''
+            escaped = str(Path(file).resolve()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_path
+
+
+def reserve_temp_file(temp_dir, suffix):
+    """Create a uniquely named empty file in temp_dir and return its path."""
+    # The OS guarantees uniqueness, so parallel workers never overwrite each other
+    with tempfile.NamedTemporaryFile(prefix='audio_sequence_', suffix=suffix,
+                                     dir=str(temp_dir), delete=False) as f:
+        return Path(f.name)
+
+
+def trim_audio_segment(segment, output_path):
+    """Cut a truncated segment in the source's format, stream-copying when it is MP3."""
+    if Path(segment['file']).suffix.lower() == '.mp3':
+        # Input-side seek and duration: MP3 frames are copied without decoding
+        try:
+            stream = ffmpeg.input(segment['file'], ss=segment['start'], t=segment['duration'])
+            output = ffmpeg.output(stream, str(output_path), acodec='copy', vn=None)
+            ffmpeg.run(output, overwrite_output=True, quiet=True)
+            return
+        except ffmpeg.Error:
+            pass  # Fall back to decoding below
     
-    # Add all songs used in this video to the global used songs set
-    used_songs.update(songs_used_in_this_video)
+    # Re-encode to the source's codec and sample layout so the tail can sit in the
+    # same concat list as the untrimmed files; output_path carries the source suffix
+    encode_args = {}
+    audio_format = get_cached_audio_format(segment['file'])
+    if audio_format:
+        codec, sample_rate, channels = audio_format
+        encode_args = {'acodec': codec, 'ar': sample_rate, 'ac': channels}
     
+    stream = ffmpeg.input(segment['file'])
+    stream = stream.filter('atrim', start=segment['start'], duration=segment['duration'])
+    output = ffmpeg.output(stream, str(output_path), **encode_args)
+    ffmpeg.run(output, overwrite_output=True, quiet=True)
+
+
+def create_audio_sequence(audio_segments, temp_dir):
+    """Prepare the files for a pre-selected sequence of songs and return their paths."""
     if not audio_segments:
         return None
     
-    # Create concatenated audio file using ffmpeg-python
-    output_audio = temp_dir / f"audio_sequence_{random.randint(1000, 9999)}.mp3"
-    
     try:
-        if len(audio_segments) == 1:
-            # Single file, just copy with potential trimming
-            segment = audio_segments[0]
-            stream = ffmpeg.input(segment['file'])
-            if segment['duration'] < get_audio_duration(segment['file']):
-                stream = stream.filter('atrim', start=segment['start'], duration=segment['duration'])
-            stream = ffmpeg.output(stream, str(output_audio), acodec='copy')
-            ffmpeg.run(stream, overwrite_output=True, quiet=True)
-        else:
-            # Multiple files, need to concatenate
-            inputs = []
-            for i, segment in enumerate(audio_segments):
-                stream = ffmpeg.input(segment['file'])
-                # Trim if needed
-                if segment['duration'] < get_audio_duration(segment['file']):
-                    stream = stream.filter('atrim', start=segment['start'], duration=segment['duration'])
-                inputs.append(stream)
-            
-            # Concatenate all inputs
-            joined = ffmpeg.concat(*inputs, v=0, a=1)
-            output = ffmpeg.output(joined, str(output_audio), acodec='mp3')
-            ffmpeg.run(output, overwrite_output=True, quiet=True)
+        parts = []
+        for segment in audio_segments:
+            if segment['trim']:
+                # Only a truncated segment is cut; whole files are used as-is
+                trimmed = reserve_temp_file(temp_dir, Path(segment['file']).suffix.lower())
+                trim_audio_segment(segment, trimmed)
+                parts.append(str(trimmed))
+            else:
+                parts.append(segment['file'])
         
-        return str(output_audio)
+        return parts
     except Exception as e:
         print(f"Error creating audio sequence: {e}")
         return None
 
 
-def create_video(image_path, audio_file, output_path, target_duration_seconds):
-    """Create a video with image and audio using ffmpeg-python."""
+# x264 settings for a static image: no motion search and one keyframe every 5 minutes
+STILL_CLIP_SECONDS = 300
+STILL_IMAGE_ENCODE = {
+    'vcodec': 'libx264',
+    'tune': 'stillimage',
+    'preset': 'veryfast',
+    'g': STILL_CLIP_SECONDS,
+    'r': 1,
+    'pix_fmt': 'yuv420p',
+}
+
+
+def encode_still_clip(image_path, output_path, threads=0):
+    """Encode an image once as a single-GOP H.264 clip that can be looped by stream copy."""
     try:
-        # Create video input (looped image)
         video_input = ffmpeg.input(str(image_path), loop=1, framerate=1)
+        output = ffmpeg.output(
+            video_input,
+            str(output_path),
+            threads=threads,
+            t=STILL_CLIP_SECONDS,
+            **STILL_IMAGE_ENCODE
+        )
+        ffmpeg.run(output, overwrite_output=True, quiet=True)
+        return True
+    except Exception as e:
+        print(f"Error encoding still clip for {image_path}: {e}")
+        return False
+
+
+def create_video(still_clip, audio_parts, output_path, target_duration_seconds, temp_dir, threads=0):
+    """Loop a pre-encoded still clip under a sequence of audio files in one ffmpeg run."""
+    try:
+        # Loop the clip indefinitely; video is stream-copied, never re-encoded
+        video_input = ffmpeg.input(str(still_clip), stream_loop=-1)
         
-        if audio_file:
-            # Create audio input
-            audio_input = ffmpeg.input(audio_file)
+        if audio_parts:
+            if audio_parts_share_format(audio_parts):
+                # Matching parts are read straight from a concat list
+                concat_list = write_concat_list(audio_parts, reserve_temp_file(temp_dir, '.txt'))
+                audio_stream = ffmpeg.input(str(concat_list), format='concat', safe=0).audio
+            else:
+                # Mixed codecs or sample layouts need per-file decoders and the concat filter
+                inputs = [ffmpeg.input(part).audio for part in audio_parts]
+                audio_stream = ffmpeg.concat(*inputs, v=0, a=1)
             
-            # Combine video and audio
+            # Combine video and audio (encoded once to AAC), ignoring any cover art
             output = ffmpeg.output(
-                video_input, audio_input,
+                video_input.video, audio_stream,
                 str(output_path),
-                vcodec='libx264',
+                vcodec='copy',
                 acodec='aac',
-                pix_fmt='yuv420p',
+                threads=threads,
                 shortest=None  # Stop when shortest input ends
             )
         else:
@@ -168,8 +319,7 @@ def create_video(image_path, audio_file, output_path, target_duration_seconds):
             output = ffmpeg.output(
                 video_input,
                 str(output_path),
-                vcodec='libx264',
-                pix_fmt='yuv420p',
+                vcodec='copy',
                 t=target_duration_seconds
             )
         
@@ -177,22 +327,69 @@ def create_video(image_path, audio_file, output_path, target_duration_seconds):
         return True
         
     except Exception as e:
-        print(f"Error creating video for {image_path}: {e}")
+        print(f"Error creating video from {still_clip}: {e}")
         return False
 
 
-def check_ffmpeg():
-    """Check if ffmpeg is available (ffmpeg-python will handle this)."""
-    try:
-        # Test if we can run a simple ffmpeg command
-        test_stream = ffmpeg.input('pipe:', f='lavfi', t=0.1)
-        test_output = ffmpeg.output(test_stream, 'pipe:', f='null')
-        ffmpeg.run(test_output, pipe_stdout=True, pipe_stderr=True, quiet=True)
+def get_output_names(image_files):
+    """Return one output filename per image, unique even when images share a stem."""
+    # Compare case-insensitively: a.jpg and A.png collide on Windows and macOS
+    stem_counts = Counter(image_path.stem.lower() for image_path in image_files)
+    taken = {f"{image_path.stem}_video.mp4".lower() for image_path in image_files
+             if stem_counts[image_path.stem.lower()] == 1}
+    
+    names = []
+    for i, image_path in enumerate(image_files, 1):
+        name = f"{image_path.stem}_video.mp4"
+        if stem_counts[image_path.stem.lower()] > 1:
+            # Keep the extension to tell a.jpg from a.png, then the index for a.jpg vs a.JPG
+            name = f"{image_path.stem}_{image_path.suffix[1:]}_video.mp4"
+            if name.lower() in taken:
+                name = f"{image_path.stem}_{image_path.suffix[1:]}_{i}_video.mp4"
+            taken.add(name.lower())
+        names.append(name)
+    
+    return names
+
+
+def process_image(image_path, index, total, audio_segments, time_limit_seconds,
+                  temp_dir, output_path, threads):
+    """Build the audio sequence and video for one image; return True on success."""
+    print(f"\nProcessing image {index}/{total}: {image_path.name}")
+    
+    # Create audio sequence from the songs assigned to this image
+    audio_parts = create_audio_sequence(audio_segments, temp_dir)
+    
+    if not audio_parts:
+        print(f"Warning: Could not create audio sequence for {image_path.name}")
+        return False
+    
+    output_filename = output_path.name
+    
+    # Encode the image once, then loop it by stream copy under the audio
+    still_clip = temp_dir / f"still_{index}_{image_path.stem}.mp4"
+    if not encode_still_clip(image_path, still_clip, threads):
+        print(f"❌ Failed to create video for: {image_path.name}")
+        return False
+    
+    # Create video
+    print(f"Creating video: {output_filename}")
+    if create_video(still_clip, audio_parts, output_path, time_limit_seconds, temp_dir, threads):
+        print(f"✅ Successfully created: {output_path}")
         return True
-    except Exception:
-        print("Error: ffmpeg is required but not found or not working.")
+    
+    print(f"❌ Failed to create video for: {image_path.name}")
+    return False
+
+
+def check_ffmpeg():
+    """Check if ffmpeg and ffprobe are on PATH without spawning them."""
+    missing = [tool for tool in ("ffmpeg", "ffprobe") if not shutil.which(tool)]
+    if missing:
+        print(f"Error: {', '.join(missing)} is required but not found.")
         print("Please install ffmpeg: https://ffmpeg.org/download.html")
         return False
+    return True
 
 
 def main():
@@ -202,12 +399,14 @@ def main():
     parser.add_argument('time_limit', type=int, help='Time limit in minutes')
     parser.add_argument('output_folder', nargs='?', default='./output', 
                        help='Output folder (default: ./output)')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                       help='Number of videos to encode in parallel (default: min(4, CPU count))')
     
     args = parser.parse_args()
     
     # Check if ffmpeg is available
-    # if not check_ffmpeg():
-    #     return 1
+    if not check_ffmpeg():
+        return 1
     
     # Validate inputs
     image_folder = Path(args.image_folder)
@@ -249,49 +448,43 @@ def main():
         print(f"Error scanning folders: {e}")
         return 1
     
-    # Track individual songs used to ensure no song is used twice
-    used_songs = set()
+    # Read every duration and format once before any video starts
+    print(f"Reading durations of {len(mp3_files)} audio files...")
+    precompute_audio_info(mp3_files)
     
-    # Calculate if we have enough songs for all videos
-    total_songs_needed = 0
-    for image_path in image_files:
-        # Estimate songs needed per video (rough calculation)
-        # Assuming average song length of 3-4 minutes
-        estimated_songs_per_video = max(1, time_limit_seconds // 180)  # 3 minutes average
-        total_songs_needed += estimated_songs_per_video
+    # Assign songs to images up front so no song is used twice
+    partitions = partition_audio_segments(mp3_files, len(image_files), time_limit_seconds)
     
-    if total_songs_needed > len(mp3_files):
-        print(f"Warning: May not have enough unique songs for all videos.")
-        print(f"Estimated songs needed: {total_songs_needed}, Available: {len(mp3_files)}")
-        print(f"Some videos may have shorter durations or reuse songs.")
+    short_videos = sum(
+        1 for segments in partitions
+        if sum(segment['duration'] for segment in segments) < time_limit_seconds
+    )
+    if short_videos:
+        print(f"Warning: Not enough unique songs for all videos.")
+        print(f"{short_videos} of {len(image_files)} videos will be shorter than "
+              f"{args.time_limit} minutes or skipped.")
     
     # Create temporary directory for intermediate files
     with tempfile.TemporaryDirectory() as temp_dir:
         temp_path = Path(temp_dir)
         
-        # Process each image
-        successful = 0
-        for i, image_path in enumerate(image_files, 1):
-            print(f"\nProcessing image {i}/{len(image_files)}: {image_path.name}")
-            
-            # Create audio sequence using only unused songs
-            audio_file = create_audio_sequence(mp3_files, time_limit_seconds, used_songs, temp_path)
-            
-            if not audio_file:
-                print(f"Warning: Could not create audio sequence for {image_path.name}")
-                continue
-            
-            # Create output filename
-            output_filename = f"{image_path.stem}_video.mp4"
-            output_path = output_folder / output_filename
-            
-            # Create video
-            print(f"Creating video: {output_filename}")
-            if create_video(image_path, audio_file, output_path, time_limit_seconds):
-                successful += 1
-                print(f"✅ Successfully created: {output_path}")
-            else:
-                print(f"❌ Failed to create video for: {image_path.name}")
+        # Process images in parallel, splitting CPU threads between ffmpeg jobs
+        workers = max(1, min(args.workers, len(image_files)))
+        ffmpeg_threads = max(1, (os.cpu_count() or 1) // workers)
+        
+        # Output paths are fixed before any job starts so no two jobs share a file
+        output_paths = [output_folder / name for name in get_output_names(image_files)]
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    process_image, image_path, i, len(image_files), audio_segments,
+                    time_limit_seconds, temp_path, output_path, ffmpeg_threads
+                )
+                for i, (image_path, audio_segments, output_path)
+                in enumerate(zip(image_files, partitions, output_paths), 1)
+            ]
+            successful = sum(1 for future in futures if future.result())
     
         print(f"\n🎬 Process complete! Successfully created {successful}/{len(image_files)} videos")
         print(f"📁 Output folder: {output_folder.absolute()}")
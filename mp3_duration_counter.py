@@ -6,7 +6,7 @@ Calculates the total length of all MP3 files in a specified folder.
 
 import os
 import sys
-import glob
+from concurrent.futures import ThreadPoolExecutor
 from mutagen.mp3 import MP3
 from mutagen.id3 import ID3NoHeaderError
 
@@ -32,9 +32,13 @@ def format_duration(seconds):
 
 def count_mp3_durations(folder_path="."):
     """Count total duration of all MP3 files in the specified folder."""
-    # Get all MP3 files in the folder
-    mp3_pattern = os.path.join(folder_path, "*.mp3")
-    mp3_files = glob.glob(mp3_pattern)
+    # Get all MP3 files in the folder with a single directory pass
+    with os.scandir(folder_path) as entries:
+        mp3_files = [
+            entry.path for entry in entries
+            if entry.is_file() and not entry.name.startswith(".")
+            and entry.name.lower().endswith(".mp3")
+        ]
     
     if not mp3_files:
         print(f"No MP3 files found in {folder_path}")
@@ -47,16 +51,23 @@ def count_mp3_durations(folder_path="."):
     print("Analyzing files...")
     print("-" * 50)
     
-    for file_path in sorted(mp3_files):
+    # Read headers in parallel; results come back in sorted order
+    mp3_files = sorted(mp3_files)
+    with ThreadPoolExecutor(max_workers=min(32, len(mp3_files))) as executor:
+        durations = list(executor.map(get_mp3_duration, mp3_files))
+    
+    # Collect per-file lines and write them in one call
+    lines = []
+    for file_path, duration in zip(mp3_files, durations):
         filename = os.path.basename(file_path)
-        duration = get_mp3_duration(file_path)
         
         if duration > 0:
             total_duration += duration
             file_count += 1
-            print(f"{filename:<50} {format_duration(duration)}")
+            lines.append(f"{filename:<50} {format_duration(duration)}")
         else:
-            print(f"{filename:<50} ERROR")
+            lines.append(f"{filename:<50} ERROR")
+    sys.stdout.write("\n".join(lines) + "\n")
     
     print("-" * 50)
     print(f"Successfully processed: {file_count} files")
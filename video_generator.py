@@ -8,37 +8,58 @@ long-form background videos perfect for study/work sessions.
 Workflow:
 1. Downloads playlist audio using existing playlist_to_mp3.py
 2. Stitches audio tracks using existing stitch_mp3.py  
-3. Crops animation video if requested (optional)
-4. Loops animation video to match audio duration
-5. Combines looped video with audio using ffmpeg
+3. Measures the stitched audio duration
+4. Loops, optionally crops, and combines the animation with audio
+   in a single ffmpeg pass
 """
 
 import argparse
-import subprocess
+import asyncio
 import sys
 import tempfile
 from pathlib import Path
 import shutil
 import json
+from dataclasses import dataclass
+try:
+    import mutagen
+except ImportError:
+    mutagen = None  # Fall back to ffprobe for every file
 
-def run_command(cmd, description=""):
-    """Run a command and handle errors gracefully"""
+@dataclass
+class MediaInfo:
+    """Metadata for one media file, read with a single ffprobe call"""
+    width: int = 0
+    height: int = 0
+    duration: float = 0.0
+
+# MediaInfo per resolved path, so each file is probed at most once
+_media_info = {}
+
+async def run_command(cmd, description=""):
+    """Run a command without blocking other stages and handle errors gracefully"""
     print(f"🔧 {description}")
     print(f"   Running: {' '.join(str(x) for x in cmd)}")
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    process = await asyncio.create_subprocess_exec(
+        *(str(x) for x in cmd),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    stdout = stdout.decode(errors="replace")
     
-    if result.returncode != 0:
+    if process.returncode != 0:
         print(f"❌ Failed: {description}")
-        print(f"   Error: {result.stderr}")
+        print(f"   Error: {stderr.decode(errors='replace')}")
         return False
     
-    if result.stdout.strip():
-        print(f"   Output: {result.stdout.strip()}")
+    if stdout.strip():
+        print(f"   Output: {stdout.strip()}")
     
     return True
 
-def download_playlist_audio(playlist_url, temp_dir, max_retries=3, time_limit_minutes=0):
+async def download_playlist_audio(playlist_url, temp_dir, max_retries=3, time_limit_minutes=0):
     """Download playlist audio using playlist_to_mp3.py"""
     script_path = Path(__file__).parent / "playlist_to_mp3.py"
     audio_dir = temp_dir / "audio"
@@ -54,7 +75,7 @@ def download_playlist_audio(playlist_url, temp_dir, max_retries=3, time_limit_mi
     if time_limit_minutes > 0:
         cmd.extend(["--time-limit", str(time_limit_minutes)])
     
-    success = run_command(cmd, "Downloading playlist audio")
+    success = await run_command(cmd, "Downloading playlist audio")
     
     if success:
         # Find the playlist directory (should be the only subdirectory in audio_dir)
@@ -64,7 +85,7 @@ def download_playlist_audio(playlist_url, temp_dir, max_retries=3, time_limit_mi
     
     return None
 
-def stitch_audio(audio_folder, output_audio_path, bitrate="192k"):
+async def stitch_audio(audio_folder, output_audio_path, bitrate="192k"):
     """Stitch MP3 files using stitch_mp3.py"""
     script_path = Path(__file__).parent / "stitch_mp3.py"
     
@@ -75,112 +96,101 @@ def stitch_audio(audio_folder, output_audio_path, bitrate="192k"):
         "--bitrate", bitrate
     ]
     
-    return run_command(cmd, "Stitching audio files")
+    return await run_command(cmd, "Stitching audio files")
 
-def get_audio_duration(audio_path):
-    """Get duration of audio file in seconds using ffprobe"""
+async def probe(path):
+    """Probe dimensions and duration of a media file once, or None on failure."""
+    key = str(Path(path).resolve())
+    if key in _media_info:
+        return _media_info[key]
+    
     cmd = [
-        "ffprobe", "-v", "quiet", "-show_entries", 
-        "format=duration", "-of", "default=noprint_wrappers=1:nokey=1",
-        str(audio_path)
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration:stream=codec_type,width,height",
+        "-of", "json", str(path)
     ]
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    if process.returncode != 0:
+        print(f"   Error: {stderr.decode(errors='replace')}")
+        return None
     
-    if result.returncode == 0:
-        try:
-            return float(result.stdout.strip())
-        except ValueError:
-            pass
+    data = json.loads(stdout)
+    info = MediaInfo(duration=float(data.get("format", {}).get("duration", 0) or 0))
     
-    return None
+    streams = data.get("streams", [])
+    video = next((st for st in streams if st.get("codec_type") == "video"), None)
+    if video:
+        info.width = video.get("width", 0)
+        info.height = video.get("height", 0)
+    
+    _media_info[key] = info
+    return info
 
-def get_video_dimensions(infile):
-    """Get width and height of the input video using ffprobe."""
-    cmd = [
-        "ffprobe", "-v", "error",
-        "-select_streams", "v:0",
-        "-show_entries", "stream=width,height",
-        "-of", "json", str(infile)
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    info = json.loads(result.stdout)
-    width = info["streams"][0]["width"]
-    height = info["streams"][0]["height"]
-    return width, height
+async def get_audio_duration(audio_path):
+    """Get duration of audio file in seconds (mutagen for MP3, ffprobe otherwise)"""
+    if mutagen is not None and Path(audio_path).suffix.lower() == ".mp3":
+        try:
+            return mutagen.File(str(audio_path)).info.length
+        except Exception:
+            pass  # Fall through to ffprobe
+    
+    info = await probe(audio_path)
+    return info.duration if info and info.duration > 0 else None
 
-def crop_video(infile, outfile, crop_right=55, crop_bottom=55):
-    """Crop crop_right and crop_bottom pixels from the video."""
-    width, height = get_video_dimensions(infile)
-    new_width = width - crop_right
-    new_height = height - crop_bottom
+async def get_video_dimensions(infile):
+    """Get width and height of the input video, or None on failure."""
+    info = await probe(infile)
+    if not info or not info.width or not info.height:
+        return None
+    return info.width, info.height
 
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", str(infile),
-        "-vf", f"crop={new_width}:{new_height}:0:0",
-        "-c:v", "libx264",
-        "-crf", "18",
-        "-preset", "veryfast",
-        "-c:a", "copy",
-        str(outfile)
+async def render_video(animation_path, audio_path, duration_seconds, output_path, crop_size=None):
+    """Loop, optionally crop to crop_size (width, height), and mux the animation with audio in a single ffmpeg run"""
+    crop = crop_size is not None
+    input_args = [
+        "ffmpeg", "-y",  # overwrite output
+        "-stream_loop", "-1",          # infinite loop
+        "-i", str(animation_path),     # input animation
+        "-i", str(audio_path),         # input audio
+        "-map", "0:v:0",               # video from the animation
+        "-map", "1:a:0",               # audio from the stitched track
+        "-t", str(int(duration_seconds)), # duration in seconds
     ]
-    return run_command(cmd, f"Cropping video ({crop_right}px right, {crop_bottom}px bottom)")
-
-def loop_animation(animation_path, duration_seconds, output_path):
-    """Loop animation video to match audio duration"""
-    # Check if input is already MP4 with compatible codec
-    input_ext = Path(animation_path).suffix.lower()
-    
-    if input_ext == '.mp4':
-        # For MP4 inputs, try stream copy first for faster processing
-        cmd = [
-            "ffmpeg", "-y",  # overwrite output
-            "-stream_loop", "-1",          # infinite loop
-            "-i", str(animation_path),     # input animation
-            "-t", str(int(duration_seconds)), # duration in seconds
+    audio_args = [
+        "-c:a", "aac",                 # encode audio to AAC
+        "-b:a", "192k",                # audio bitrate
+        "-shortest",                   # match shortest stream duration
+    ]
+    
+    # Stream copy only works for MP4 inputs that do not need cropping
+    if Path(animation_path).suffix.lower() == '.mp4' and not crop:
+        cmd = input_args + [
             "-c:v", "copy",                # copy video stream (fast)
-            "-an",                         # no audio
-            str(output_path)
-        ]
+        ] + audio_args + [str(output_path)]
         
-        # Try stream copy first
-        if run_command(cmd, f"Looping MP4 animation for {int(duration_seconds)} seconds (fast mode)"):
+        if await run_command(cmd, f"Looping MP4 animation for {int(duration_seconds)} seconds (fast mode)"):
             return True
         
         print("   Stream copy failed, falling back to re-encoding...")
     
-    # Fallback or non-MP4 input: re-encode with optimization
-    cmd = [
-        "ffmpeg", "-y",  # overwrite output
-        "-stream_loop", "-1",          # infinite loop
-        "-i", str(animation_path),     # input animation
-        "-t", str(int(duration_seconds)), # duration in seconds
+    video_args = []
+    if crop:
+        video_args += ["-vf", f"crop={crop_size[0]}:{crop_size[1]}:0:0"]
+    
+    # Fallback, cropped or non-MP4 input: re-encode with optimization
+    cmd = input_args + video_args + [
         "-c:v", "libx264",             # video codec
-        "-preset", "fast",             # faster encoding for loops
+        "-preset", "veryfast",         # faster encoding for loops
         "-crf", "20",                  # slightly better quality for MP4
         "-pix_fmt", "yuv420p",         # compatibility
         "-movflags", "+faststart",     # optimize for streaming
-        "-an",                         # no audio
-        str(output_path)
-    ]
-    
-    return run_command(cmd, f"Looping animation for {int(duration_seconds)} seconds")
-
-def combine_video_audio(video_path, audio_path, output_path):
-    """Combine video and audio using ffmpeg"""
-    cmd = [
-        "ffmpeg", "-y",  # overwrite output
-        "-i", str(video_path),         # input video
-        "-i", str(audio_path),         # input audio
-        "-c:v", "copy",                # copy video stream (no re-encode)
-        "-c:a", "aac",                 # encode audio to AAC
-        "-b:a", "192k",                # audio bitrate
-        "-shortest",                   # match shortest stream duration
-        str(output_path)
-    ]
+    ] + audio_args + [str(output_path)]
     
-    return run_command(cmd, "Combining video and audio")
+    return await run_command(cmd, f"Looping animation for {int(duration_seconds)} seconds")
 
 def check_dependencies():
     """Check if required tools are available"""
@@ -205,6 +215,76 @@ def check_dependencies():
     
     return True
 
+async def generate_video(args, animation_path, output_path):
+    """Run the pipeline stages, overlapping independent ones; return the audio duration"""
+    crop = args.crop_right > 0 or args.crop_bottom > 0
+    
+    # Use temporary directory for intermediate files
+    with tempfile.TemporaryDirectory() as temp_dir_str:
+        temp_dir = Path(temp_dir_str)
+        
+        # Step 1: Download playlist audio
+        print("\n📥 Step 1: Downloading playlist audio...")
+        playlist_folder = await download_playlist_audio(
+            args.playlist_url, temp_dir, args.max_retries, args.time_limit
+        )
+        
+        if not playlist_folder:
+            print("❌ Failed to download playlist audio")
+            sys.exit(1)
+        
+        # Step 2: Stitch audio files, probing the animation for cropping meanwhile
+        print("\n🔗 Step 2: Stitching audio files...")
+        stitched_audio = temp_dir / "stitched_audio.mp3"
+        
+        stages = [stitch_audio(playlist_folder, stitched_audio, args.bitrate)]
+        if crop:
+            stages.append(get_video_dimensions(animation_path))
+        stitched, *dimensions = await asyncio.gather(*stages)
+        
+        if not stitched:
+            print("❌ Failed to stitch audio files")
+            sys.exit(1)
+        
+        crop_size = None
+        if crop:
+            if not dimensions[0]:
+                print("❌ Failed to read animation dimensions")
+                sys.exit(1)
+            width, height = dimensions[0]
+            # Crop is applied inside the render pass; yuv420p needs even dimensions
+            crop_size = ((width - args.crop_right) // 2 * 2, (height - args.crop_bottom) // 2 * 2)
+            if crop_size[0] <= 0 or crop_size[1] <= 0:
+                print(f"❌ Crop values exceed animation size ({width}x{height})")
+                sys.exit(1)
+        
+        # Step 3: Get audio duration
+        print("\n⏱️  Step 3: Analyzing audio duration...")
+        audio_duration = await get_audio_duration(stitched_audio)
+        
+        if not audio_duration:
+            print("❌ Failed to get audio duration")
+            sys.exit(1)
+        
+        print(f"   Audio duration: {audio_duration:.1f} seconds ({audio_duration/60:.1f} minutes)")
+        
+        # Step 4: Loop, crop and combine in one pass
+        print("\n🎵 Step 4: Rendering video...")
+        if crop:
+            print(f"   Cropping {args.crop_right}px right, {args.crop_bottom}px bottom")
+        
+        if not await render_video(animation_path, stitched_audio, audio_duration, output_path, crop_size):
+            print("❌ Failed to render video")
+            sys.exit(1)
+        
+        # Keep temp files if requested
+        if args.keep_temp:
+            debug_dir = output_path.parent / f"{output_path.stem}_temp"
+            shutil.copytree(temp_dir, debug_dir)
+            print(f"🔍 Temporary files saved to: {debug_dir}")
+    
+    return audio_duration
+
 def main():
     parser = argparse.ArgumentParser(
         description="Generate lofi videos by combining animation with YouTube playlist audio",
@@ -246,6 +326,10 @@ Examples:
         print(f"❌ Animation file not found: {animation_path}")
         sys.exit(1)
     
+    if args.crop_right < 0 or args.crop_bottom < 0:
+        print("❌ Crop values must not be negative")
+        sys.exit(1)
+    
     output_path = Path(args.output).resolve()
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
@@ -260,72 +344,7 @@ Examples:
     if args.time_limit > 0:
         print(f"   Time limit: {args.time_limit} minutes")
     
-    # Use temporary directory for intermediate files
-    with tempfile.TemporaryDirectory() as temp_dir_str:
-        temp_dir = Path(temp_dir_str)
-        
-        # Step 1: Download playlist audio
-        print("\n📥 Step 1: Downloading playlist audio...")
-        playlist_folder = download_playlist_audio(
-            args.playlist_url, temp_dir, args.max_retries, args.time_limit
-        )
-        
-        if not playlist_folder:
-            print("❌ Failed to download playlist audio")
-            sys.exit(1)
-        
-        # Step 2: Stitch audio files
-        print("\n🔗 Step 2: Stitching audio files...")
-        stitched_audio = temp_dir / "stitched_audio.mp3"
-        
-        if not stitch_audio(playlist_folder, stitched_audio, args.bitrate):
-            print("❌ Failed to stitch audio files")
-            sys.exit(1)
-        
-        # Step 3: Get audio duration
-        print("\n⏱️  Step 3: Analyzing audio duration...")
-        audio_duration = get_audio_duration(stitched_audio)
-        
-        if not audio_duration:
-            print("❌ Failed to get audio duration")
-            sys.exit(1)
-        
-        print(f"   Audio duration: {audio_duration:.1f} seconds ({audio_duration/60:.1f} minutes)")
-        
-        # Step 4: Crop animation if requested
-        print("\n✂️  Step 4: Cropping animation...")
-        if args.crop_right > 0 or args.crop_bottom > 0:
-            cropped_video = temp_dir / "cropped_animation.mp4"
-            
-            if not crop_video(animation_path, cropped_video, args.crop_right, args.crop_bottom):
-                print("❌ Failed to crop animation")
-                sys.exit(1)
-            
-            animation_to_loop = cropped_video
-        else:
-            print("   Skipping cropping (no crop values specified)")
-            animation_to_loop = animation_path
-        
-        # Step 5: Loop animation to match audio duration
-        print("\n🔄 Step 5: Looping animation...")
-        looped_video = temp_dir / "looped_animation.mp4"
-        
-        if not loop_animation(animation_to_loop, audio_duration, looped_video):
-            print("❌ Failed to loop animation")
-            sys.exit(1)
-        
-        # Step 6: Combine video and audio
-        print("\n🎵 Step 6: Combining video and audio...")
-        
-        if not combine_video_audio(looped_video, stitched_audio, output_path):
-            print("❌ Failed to combine video and audio")
-            sys.exit(1)
-        
-        # Keep temp files if requested
-        if args.keep_temp:
-            debug_dir = output_path.parent / f"{output_path.stem}_temp"
-            shutil.copytree(temp_dir, debug_dir)
-            print(f"🔍 Temporary files saved to: {debug_dir}")
+    audio_duration = asyncio.run(generate_video(args, animation_path, output_path))
     
     print(f"\n✅ Video generation complete!")
     print(f"   Output: {output_path}")